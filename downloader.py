@@ -0,0 +1,372 @@
+import hashlib
+import json
+import logging
+import optparse
+import os
+import re
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scraper import RetryPolicy
+
+CHUNK_SIZE = 64 * 1024
+TRANSIENT_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+CONTENT_RANGE = re.compile(r"^bytes (?:(\d+)-\d+|\*)/(\d+)$")
+
+
+def iter_media(messages: Iterable) -> Iterator[tuple[str, str]]:
+    """
+    Yield ``(message_id, url)`` pairs for attachments and embed media.
+
+    Accepts message dicts or the lists of messages the search API returns
+    per result, so both scraper output lines and ``result["messages"]`` work.
+    Embed media is taken from Discord's cached ``proxy_url`` when present.
+    Videos without one are skipped, since their ``url`` is usually a player
+    page (e.g. YouTube) rather than a media file.
+    """
+    for item in messages:
+        group = item if isinstance(item, list) else [item]
+        for message in group:
+            message_id = message["id"]
+            for attachment in message.get("attachments", []):
+                if attachment.get("url"):
+                    yield message_id, attachment["url"]
+            for embed in message.get("embeds", []):
+                for key in ("image", "thumbnail", "video"):
+                    media = embed.get(key)
+                    if not media:
+                        continue
+                    url = media.get("proxy_url") or (key != "video" and media.get("url"))
+                    if url:
+                        yield message_id, url
+
+
+def iter_output(path: str) -> Iterator[list]:
+    """Stream message groups from a scraper output file."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class MediaDownloader:
+    """
+    Download media into a content-addressed store.
+
+    Files are saved as ``objects/<sha256[:2]>/<sha256>`` under ``root`` so
+    identical content is kept once. ``index.jsonl`` maps each message ID and
+    URL to the stored hash. Interrupted downloads are kept under ``partial/``
+    with the server's ETag or Last-Modified validator, and resumed with an
+    ``If-Range`` request only while the remote file is unchanged.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_workers: int = 8,
+        retry_policy: RetryPolicy | None = None,
+        timeout: float = 30.0,
+    ) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.root = root
+        self.max_workers = max_workers
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.timeout = timeout
+        self.objects_dir = os.path.join(root, "objects")
+        self.partial_dir = os.path.join(root, "partial")
+        self.index_path = os.path.join(root, "index.jsonl")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.partial_dir, exist_ok=True)
+
+        self._local = threading.local()
+        self._sessions: list[requests.Session] = []
+        self._lock = threading.Lock()
+        self._futures: dict[str, Future] = {}
+        self._indexed: set[tuple[str, str]] = set()
+        self._known: dict[str, str] = {}
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """Load previously downloaded URLs from the index."""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "rb") as f:
+            lines = f.readlines()
+        offset = 0
+        for number, line in enumerate(lines, start=1):
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                if number == len(lines):
+                    # An interrupted append leaves a partial last line; cut it
+                    # off so the next append starts on a fresh line.
+                    logging.warning(f"Truncating malformed last line of {self.index_path}")
+                    with open(self.index_path, "r+b") as f:
+                        f.truncate(offset)
+                else:
+                    logging.warning(f"Skipping malformed line {number} of {self.index_path}")
+                offset += len(line)
+                continue
+            offset += len(line)
+            if number == len(lines) and not line.endswith(b"\n"):
+                with open(self.index_path, "ab") as f:
+                    f.write(b"\n")
+            self._indexed.add((entry["message_id"], entry["url"]))
+            if os.path.exists(self.object_path(entry["sha256"])):
+                self._known[entry["url"]] = entry["sha256"]
+
+    def _session(self) -> requests.Session:
+        """Return this thread's session, holding one pooled connection per host."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=1)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self) -> None:
+        """Close every session opened by download threads."""
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+            self._local = threading.local()
+        for session in sessions:
+            session.close()
+
+    def object_path(self, sha256: str) -> str:
+        """Return the storage path for a content hash."""
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def _partial_path(self, url: str) -> str:
+        """Return the partial download path for a URL."""
+        return os.path.join(self.partial_dir, hashlib.sha256(url.encode()).hexdigest())
+
+    def fetch(self, url: str) -> str:
+        """Download a URL into the store and return its content hash."""
+        policy = self.retry_policy
+        partial = self._partial_path(url)
+        attempt = 0
+        while True:
+            try:
+                self._fetch_partial(url, partial)
+                break
+            except requests.RequestException as e:
+                attempt += 1
+                logging.error(f"Download failed: {url}, {e}")
+                response = getattr(e, "response", None)
+                if isinstance(e, requests.HTTPError):
+                    if response is None or (
+                        response.status_code < 500 and response.status_code != 429
+                    ):
+                        raise
+                elif not isinstance(e, TRANSIENT_ERRORS):
+                    # Invalid URLs, unsupported schemes and redirect loops won't recover.
+                    raise
+                if attempt >= policy.max_errors:
+                    raise
+                retry_after = policy.retry_after(response) if response is not None else None
+                time.sleep(retry_after if retry_after is not None else policy.backoff(attempt))
+
+        sha256 = hashlib.sha256()
+        with open(partial, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        destination = self.object_path(digest)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if os.path.exists(destination):
+            os.remove(partial)
+        else:
+            os.replace(partial, destination)
+        self._discard_partial(partial)
+        return digest
+
+    def _discard_partial(self, partial: str) -> None:
+        """Remove a partial download and its metadata."""
+        for path in (partial, f"{partial}.meta"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _fetch_partial(self, url: str, partial: str) -> None:
+        """
+        Download ``url`` into ``partial``, resuming from its current size.
+
+        A resume is only trusted when the server confirms, via ``If-Range``
+        and ``Content-Range``, that it continues the same file at the same
+        offset. Otherwise the partial is discarded and fetched from scratch.
+        """
+        meta_path = f"{partial}.meta"
+        meta = {}
+        if os.path.exists(partial) and os.path.exists(meta_path):
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                logging.warning(f"Discarding unreadable metadata for {url}")
+            if not isinstance(meta, dict):
+                meta = {}
+        validator = meta.get("etag") or meta.get("last_modified")
+        if validator is None:
+            self._discard_partial(partial)
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        headers = {"Range": f"bytes={offset}-", "If-Range": validator} if offset else {}
+
+        with self._session().get(
+            url, headers=headers, stream=True, timeout=self.timeout
+        ) as response:
+            if offset and response.status_code in (206, 416):
+                match = CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+                start = match and match.group(1)
+                total = int(match.group(2)) if match else None
+                if response.status_code == 416:
+                    # Nothing left to fetch only if the partial is exactly the remote file.
+                    if total == offset and meta.get("length") in (None, total):
+                        return
+                elif (
+                    start is not None
+                    and int(start) == offset
+                    and meta.get("length") in (None, total)
+                ):
+                    with open(partial, "ab") as f:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+                    return
+                logging.warning(f"Partial download of {url} no longer matches, restarting")
+                self._discard_partial(partial)
+                response.close()
+                self._fetch_partial(url, partial)
+                return
+
+            response.raise_for_status()
+            length = response.headers.get("Content-Length")
+            meta = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "length": int(length) if length is not None else None,
+            }
+            with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(f"{meta_path}.tmp", meta_path)
+            with open(partial, "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+
+    def _record(self, message_id: str, url: str, sha256: str) -> None:
+        """Append a message-to-object mapping to the index."""
+        with self._lock:
+            self._known[url] = sha256
+            if (message_id, url) in self._indexed:
+                return
+            self._indexed.add((message_id, url))
+            entry = {
+                "message_id": message_id,
+                "url": url,
+                "filename": os.path.basename(urlsplit(url).path),
+                "sha256": sha256,
+            }
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def _on_done(self, message_id: str, url: str, future: Future) -> bool:
+        """Record a finished download, returning whether it succeeded."""
+        if future.exception() is not None:
+            logging.error(f"Giving up on {url}: {future.exception()}")
+            return False
+        self._record(message_id, url, future.result())
+        return True
+
+    def download(self, media: Iterable[tuple[str, str]]) -> dict[str, int]:
+        """
+        Download every ``(message_id, url)`` pair and return summary counts.
+
+        At most ``max_workers * 2`` downloads are queued at once so large
+        outputs can be streamed without loading every URL up front. Repeated
+        URLs count as skipped once their shared download succeeds, or as
+        failed if it does not.
+        """
+        stats = {"downloaded": 0, "skipped": 0, "failed": 0}
+        slots = threading.BoundedSemaphore(self.max_workers * 2)
+
+        def finish(future: Future, message_id: str, url: str, duplicate: bool) -> None:
+            succeeded = self._on_done(message_id, url, future)
+            key = ("skipped" if duplicate else "downloaded") if succeeded else "failed"
+            with self._lock:
+                stats[key] += 1
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for message_id, url in media:
+                    with self._lock:
+                        sha256 = self._known.get(url)
+                        future = self._futures.get(url)
+                    if sha256 is not None:
+                        self._record(message_id, url, sha256)
+                        with self._lock:
+                            stats["skipped"] += 1
+                    elif future is not None:
+                        future.add_done_callback(
+                            lambda f, m=message_id, u=url: finish(f, m, u, True)
+                        )
+                    else:
+                        slots.acquire()
+                        future = pool.submit(self.fetch, url)
+                        with self._lock:
+                            self._futures[url] = future
+                        future.add_done_callback(lambda _: slots.release())
+                        future.add_done_callback(
+                            lambda f, m=message_id, u=url: finish(f, m, u, False)
+                        )
+        finally:
+            with self._lock:
+                self._futures.clear()
+            self.close()
+        return stats
+
+
+if __name__ == "__main__":
+    cliparser = optparse.OptionParser(usage="%prog [options] OUTPUT.jsonl [OUTPUT.jsonl ...]")
+    cliparser.add_option(
+        "-d",
+        "--dest",
+        dest="dest",
+        default="media",
+        help="Directory for the content-addressed media store. Default: media.",
+    )
+    cliparser.add_option(
+        "-w",
+        "--workers",
+        dest="workers",
+        type="int",
+        default=8,
+        help="Number of concurrent downloads. Default: 8.",
+    )
+
+    (options, args) = cliparser.parse_args()
+    if not args:
+        cliparser.print_help()
+        cliparser.error("No scraper output files provided")
+
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)s %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%SZ",
+        level=logging.INFO,
+    )
+
+    downloader = MediaDownloader(options.dest, max_workers=options.workers)
+    for path in args:
+        stats = downloader.download(iter_media(iter_output(path)))
+        print(f"{path}: {stats}")
@@ -4,8 +4,12 @@ import logging
 import math
 import optparse
 import os
+import random
 import re
+import threading
 import time
+from collections import deque
+from email.utils import parsedate_to_datetime
 
 import requests
 
@@ -32,6 +36,168 @@ def is_snowflake(snowflake: str) -> bool:
     return bool(re.match(pattern, snowflake))
 
 
+class SearchError(Exception):
+    """Raised when a search request cannot be completed."""
+
+
+class RetryPolicy:
+    """
+    Decide how failed search requests are retried.
+
+    Transient failures (5xx, network errors) back off exponentially with full
+    jitter. Errors are counted over a sliding window of ``error_window``
+    seconds, so sporadic failures over a long crawl do not accumulate.
+    Index-not-ready responses are retried at most ``max_index_retries`` times,
+    and server-requested delays are capped at ``max_retry_after`` seconds.
+    """
+
+    def __init__(
+        self,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        max_errors: int = 5,
+        error_window: float = 600.0,
+        index_retry_delay: float = 2.0,
+        max_index_retries: int = 30,
+        max_retry_after: float = 300.0,
+        timeout: float = 30.0,
+        fatal_statuses: frozenset[int] = frozenset({401, 403}),
+    ) -> None:
+        if base_delay <= 0 or max_delay < base_delay:
+            raise ValueError("Invalid backoff delays")
+        if max_errors < 1:
+            raise ValueError("max_errors must be at least 1")
+        if max_index_retries < 0:
+            raise ValueError("max_index_retries must not be negative")
+        if max_retry_after < 0 or timeout <= 0:
+            raise ValueError("Invalid retry_after cap or timeout")
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_errors = max_errors
+        self.error_window = error_window
+        self.index_retry_delay = index_retry_delay
+        self.max_index_retries = max_index_retries
+        self.max_retry_after = max_retry_after
+        self.timeout = timeout
+        self.fatal_statuses = fatal_statuses
+
+    def backoff(self, attempt: int) -> float:
+        """Return a jittered delay for the given consecutive failure attempt."""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** max(attempt - 1, 0))
+        return random.uniform(0, ceiling)
+
+    def retry_after(self, response: requests.Response) -> float | None:
+        """Return the delay requested by the server, if any, capped at ``max_retry_after``."""
+        header = response.headers.get("Retry-After")
+        if header:
+            try:
+                return self._clamp(float(header))
+            except ValueError:
+                try:
+                    retry_at = parsedate_to_datetime(header)
+                except (TypeError, ValueError):
+                    retry_at = None
+                if retry_at is not None:
+                    now = datetime.datetime.now(retry_at.tzinfo)
+                    return self._clamp((retry_at - now).total_seconds())
+        try:
+            body = response.json()
+        except ValueError:
+            return None
+        if isinstance(body, dict) and body.get("retry_after") is not None:
+            try:
+                return self._clamp(float(body["retry_after"]))
+            except (TypeError, ValueError):
+                return None
+        return None
+
+    def _clamp(self, delay: float) -> float | None:
+        """Clamp a server-requested delay to ``[0, max_retry_after]``."""
+        if math.isnan(delay):
+            return None
+        return min(max(delay, 0.0), self.max_retry_after)
+
+
+class CircuitBreaker:
+    """
+    Pause every searcher sharing this breaker after repeated failures.
+
+    After ``failure_threshold`` consecutive failures the circuit opens for
+    ``reset_timeout`` seconds; callers block in ``wait`` until it closes. Once
+    the timeout passes the circuit is half-open: a single caller is let
+    through as a probe while the others keep waiting. A successful probe
+    closes the circuit, a failed one reopens it. The breaker is thread-safe
+    so one instance can be shared between workers.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.open_until = 0.0
+        self._condition = threading.Condition()
+
+    def wait(self) -> None:
+        """Block until the circuit is closed or this caller is chosen as the probe."""
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                remaining = self.open_until - now
+                if remaining <= 0:
+                    if self.state == self.CLOSED:
+                        return
+                    if self.state in (self.OPEN, self.HALF_OPEN):
+                        self.state = self.HALF_OPEN
+                        # If the probe never reports back, let another caller probe.
+                        self.open_until = now + self.reset_timeout
+                        logging.info("Circuit half-open, probing")
+                        return
+                if self.state == self.HALF_OPEN:
+                    self._condition.wait(remaining)
+                    continue
+            logging.warning(f"Circuit open, pausing for {remaining:.1f} seconds")
+            time.sleep(remaining)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller in ``wait`` for at least ``seconds``."""
+        with self._condition:
+            self.open_until = max(self.open_until, time.monotonic() + seconds)
+
+    def record_failure(self) -> bool:
+        """
+        Record a failed request, opening the circuit at the threshold.
+
+        Return ``True`` if the failure was a half-open probe, which reopens
+        the circuit immediately.
+        """
+        with self._condition:
+            probe = self.state == self.HALF_OPEN
+            if not probe:
+                self.failures += 1
+                if self.failures < self.failure_threshold:
+                    return False
+            self.failures = 0
+            self.state = self.OPEN
+            self.open_until = max(self.open_until, time.monotonic() + self.reset_timeout)
+            self._condition.notify_all()
+        logging.error(f"Circuit opened for {self.reset_timeout} seconds")
+        return probe
+
+    def record_success(self) -> None:
+        """Record a successful request, closing the circuit."""
+        with self._condition:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                self.open_until = 0.0
+                self._condition.notify_all()
+
+
 class DiscordSearcher:
     """
     A class for searching messages in a Discord guild using the Discord API.
@@ -46,6 +212,8 @@ class DiscordSearcher:
         channel_id: str | None = None,
         after: str | None = None,
         before: str | None = None,
+        retry_policy: RetryPolicy | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
     ) -> None:
         if not token:
             # Check if token is in environment variable
@@ -65,8 +233,10 @@ class DiscordSearcher:
         self.channel_id = channel_id
         self.after = after
         self.before = before
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.error_times: deque[float] = deque()
         self.error_count = 0
-        self.MAX_ERROR = 5
         self.DISCORD_API_OFFSET_LIMIT = 400
 
         logging.basicConfig(
@@ -139,38 +309,82 @@ class DiscordSearcher:
 
     def search(self, query: str) -> dict:
         """Given a search query, return the search results."""
+        policy = self.retry_policy
+        attempt = 0
+        index_retries = 0
         while True:
-            response: requests.Response = requests.get(
-                query,
-                headers={
-                    "authorization": self.token,
-                    # "Sec-Ch-Ua": '"Brave";v="123", "Not?A_Brand";v="8", "Chromium";v="123"',
-                    # "Sec-Ch-Ua-Mobile": "?0",
-                    # "Sec-Ch-Ua-Platform": '"Windows"',
-                    # "Sec-Fetch-Dest": "empty",
-                    # "Sec-Fetch-Mode": "cors",
-                    # "Sec-Fetch-Site": "same-origin",
-                    # "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
-                    # "X-Debug-Options": "bugReporterEnabled",
-                    # "X-Discord-Locale": "en-GB",
-                    # "X-Discord-Timezone": "Asia/Singapore",
-                    # "X-Super-Properties": "eyJvcyI6IldpbmRvd3MiLCJicm93c2VyIjoiQ2hyb21lIiwiZGV2aWNlIjoiIiwic3lzdGVtX2xvY2FsZSI6ImVuLUdCIiwiYnJvd3Nlcl91c2VyX2FnZW50IjoiTW96aWxsYS81LjAgKFdpbmRvd3MgTlQgMTAuMDsgV2luNjQ7IHg2NCkgQXBwbGVXZWJLaXQvNTM3LjM2IChLSFRNTCwgbGlrZSBHZWNrbykgQ2hyb21lLzEyMy4wLjAuMCBTYWZhcmkvNTM3LjM2IiwiYnJvd3Nlcl92ZXJzaW9uIjoiMTIzLjAuMC4wIiwib3NfdmVyc2lvbiI6IjEwIiwicmVmZXJyZXIiOiIiLCJyZWZlcnJpbmdfZG9tYWluIjoiIiwicmVmZXJyZXJfY3VycmVudCI6IiIsInJlZmVycmluZ19kb21haW5fY3VycmVudCI6IiIsInJlbGVhc2VfY2hhbm5lbCI6InN0YWJsZSIsImNsaWVudF9idWlsZF9udW1iZXIiOjI4MTgwOSwiY2xpZW50X2V2ZW50X3NvdXJjZSI6bnVsbH0=",
-                },
-            )
-            if response.status_code == 429:
-                error = response.json()
-                retry_after = error["retry_after"]
-                logging.warning(f"Rate limited, retrying in {retry_after} seconds")
-                time.sleep(retry_after)
+            self.circuit_breaker.wait()
+            try:
+                response: requests.Response = requests.get(
+                    query,
+                    headers={
+                        "authorization": self.token,
+                        # "Sec-Ch-Ua": '"Brave";v="123", "Not?A_Brand";v="8", "Chromium";v="123"',
+                        # "Sec-Ch-Ua-Mobile": "?0",
+                        # "Sec-Ch-Ua-Platform": '"Windows"',
+                        # "Sec-Fetch-Dest": "empty",
+                        # "Sec-Fetch-Mode": "cors",
+                        # "Sec-Fetch-Site": "same-origin",
+                        # "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
+                        # "X-Debug-Options": "bugReporterEnabled",
+                        # "X-Discord-Locale": "en-GB",
+                        # "X-Discord-Timezone": "Asia/Singapore",
+                        # "X-Super-Properties": "eyJvcyI6IldpbmRvd3MiLCJicm93c2VyIjoiQ2hyb21lIiwiZGV2aWNlIjoiIiwic3lzdGVtX2xvY2FsZSI6ImVuLUdCIiwiYnJvd3Nlcl91c2VyX2FnZW50IjoiTW96aWxsYS81LjAgKFdpbmRvd3MgTlQgMTAuMDsgV2luNjQ7IHg2NCkgQXBwbGVXZWJLaXQvNTM3LjM2IChLSFRNTCwgbGlrZSBHZWNrbykgQ2hyb21lLzEyMy4wLjAuMCBTYWZhcmkvNTM3LjM2IiwiYnJvd3Nlcl92ZXJzaW9uIjoiMTIzLjAuMC4wIiwib3NfdmVyc2lvbiI6IjEwIiwicmVmZXJyZXIiOiIiLCJyZWZlcnJpbmdfZG9tYWluIjoiIiwicmVmZXJyZXJfY3VycmVudCI6IiIsInJlZmVycmluZ19kb21haW5fY3VycmVudCI6IiIsInJlbGVhc2VfY2hhbm5lbCI6InN0YWJsZSIsImNsaWVudF9idWlsZF9udW1iZXIiOjI4MTgwOSwiY2xpZW50X2V2ZW50X3NvdXJjZSI6bnVsbH0=",
+                    },
+                    timeout=policy.timeout,
+                )
+            except requests.RequestException as e:
+                attempt += 1
+                self._record_error(f"Request failed: {e}")
+                time.sleep(policy.backoff(attempt))
                 continue
-            elif response.status_code == 200:
+
+            status = response.status_code
+            if status == 200:
+                self.circuit_breaker.record_success()
                 return response.json()
+            elif status == 202:
+                # Discord is still indexing the guild; this is not an error,
+                # but a guild that never finishes indexing must not loop forever.
+                index_retries += 1
+                if index_retries > policy.max_index_retries:
+                    raise SearchError("Search index not ready, giving up")
+                delay = policy.retry_after(response) or policy.index_retry_delay
+                logging.info(f"Search index not ready, retrying in {delay} seconds")
+                time.sleep(delay)
+            elif status == 429:
+                delay = policy.retry_after(response) or policy.backoff(attempt + 1)
+                logging.warning(f"Rate limited, retrying in {delay} seconds")
+                if response.headers.get("X-RateLimit-Global"):
+                    self.circuit_breaker.pause(delay)
+                else:
+                    time.sleep(delay)
+            elif status in policy.fatal_statuses or status < 500:
+                # Other client errors (bad query, unknown guild) will not fix themselves.
+                raise SearchError(f"Error: {status}, {response.text}")
             else:
-                self.error_count += 1
-                logging.error(f"Error: {response.status_code}, {response.text}")
-                if self.error_count == self.MAX_ERROR:
-                    raise Exception("Max errors reached")
-                time.sleep(5)
+                attempt += 1
+                self._record_error(f"Error: {status}, {response.text}")
+                retry_after = policy.retry_after(response)
+                time.sleep(retry_after if retry_after is not None else policy.backoff(attempt))
+
+    def _record_error(self, message: str) -> None:
+        """
+        Count an error in the sliding window, raising once the limit is hit.
+
+        Failed circuit-breaker probes are not counted, so an outage longer
+        than the error window is ridden out instead of killing the job.
+        """
+        logging.error(message)
+        if self.circuit_breaker.record_failure():
+            return
+        now = time.monotonic()
+        self.error_times.append(now)
+        while self.error_times and now - self.error_times[0] > self.retry_policy.error_window:
+            self.error_times.popleft()
+        self.error_count = len(self.error_times)
+        if self.error_count >= self.retry_policy.max_errors:
+            raise SearchError("Max errors reached")
 
     def _update_query_params(self, last_message_timestamp: str) -> None:
         """Update the query parameters with the last message ID."""
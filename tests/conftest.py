@@ -1,5 +1,6 @@
 """Pytest configuration and fixtures."""
 
+from unittest.mock import MagicMock
 
 import pytest
 
@@ -14,3 +15,20 @@ def tmp_path(tmp_path_factory):
 def temp_output_file(tmp_path):
     """Fixture providing a temporary output file path."""
     return str(tmp_path / "test_output.jsonl")
+
+
+@pytest.fixture
+def make_response():
+    """Fixture providing a factory for mock HTTP responses."""
+
+    def factory(status_code=200, headers=None, body=None):
+        response = MagicMock()
+        response.status_code = status_code
+        response.headers = headers or {}
+        if body is None:
+            response.json.side_effect = ValueError("No JSON")
+        else:
+            response.json.return_value = body
+        return response
+
+    return factory
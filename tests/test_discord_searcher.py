@@ -1,12 +1,14 @@
 """Tests for DiscordSearcher class."""
 
+import itertools
 import json
 import os
 from unittest.mock import patch
 
 import pytest
+import requests
 
-from scraper import DiscordSearcher
+from scraper import CircuitBreaker, DiscordSearcher, RetryPolicy, SearchError
 
 
 @pytest.fixture
@@ -268,3 +270,185 @@ class TestUpdateQueryParams:
         searcher.query = None
         with pytest.raises(ValueError, match="No query set"):
             searcher._update_query_params("99999999999999999")
+
+
+class TestSearch:
+    """Tests for search method retry behavior."""
+
+    @pytest.fixture
+    def retrying_searcher(self, mock_token, mock_guild_id):
+        """Fixture providing a searcher with a small retry budget."""
+        with patch("scraper.logging.basicConfig"):
+            return DiscordSearcher(
+                guild_id=mock_guild_id,
+                token=mock_token,
+                retry_policy=RetryPolicy(max_errors=3, error_window=60.0),
+                circuit_breaker=CircuitBreaker(failure_threshold=100),
+            )
+
+    def test_search_success(self, retrying_searcher, make_response):
+        """Test that a 200 response is returned immediately."""
+        with patch("scraper.requests.get", return_value=make_response(200, body={"ok": 1})):
+            assert retrying_searcher.search("url") == {"ok": 1}
+
+    def test_search_retries_server_errors(self, retrying_searcher, make_response):
+        """Test that 5xx responses are retried with backoff."""
+        responses = [make_response(502), make_response(503), make_response(200, body={})]
+        with (
+            patch("scraper.requests.get", side_effect=responses),
+            patch("scraper.time.sleep") as mock_sleep,
+        ):
+            assert retrying_searcher.search("url") == {}
+        assert mock_sleep.call_count == 2
+        assert retrying_searcher.error_count == 2
+
+    def test_search_retries_timeouts(self, retrying_searcher, make_response):
+        """Test that stalled requests time out and are retried."""
+        responses = [requests.Timeout("stalled"), make_response(200, body={})]
+        with (
+            patch("scraper.requests.get", side_effect=responses) as mock_get,
+            patch("scraper.time.sleep"),
+        ):
+            assert retrying_searcher.search("url") == {}
+        assert mock_get.call_args.kwargs["timeout"] == retrying_searcher.retry_policy.timeout
+        assert retrying_searcher.error_count == 1
+
+    def test_search_retries_network_errors(self, retrying_searcher, make_response):
+        """Test that connection errors are retried."""
+        responses = [requests.ConnectionError("reset"), make_response(200, body={})]
+        with (
+            patch("scraper.requests.get", side_effect=responses),
+            patch("scraper.time.sleep"),
+        ):
+            assert retrying_searcher.search("url") == {}
+
+    def test_search_honors_retry_after(self, retrying_searcher, make_response):
+        """Test that Retry-After is used instead of backoff."""
+        responses = [
+            make_response(503, headers={"Retry-After": "12"}),
+            make_response(200, body={}),
+        ]
+        with (
+            patch("scraper.requests.get", side_effect=responses),
+            patch("scraper.time.sleep") as mock_sleep,
+        ):
+            retrying_searcher.search("url")
+        mock_sleep.assert_called_once_with(12.0)
+
+    def test_search_rate_limited(self, retrying_searcher, make_response):
+        """Test that 429 responses are retried without counting as errors."""
+        responses = [make_response(429, body={"retry_after": 3}), make_response(200, body={})]
+        with (
+            patch("scraper.requests.get", side_effect=responses),
+            patch("scraper.time.sleep") as mock_sleep,
+        ):
+            retrying_searcher.search("url")
+        mock_sleep.assert_called_once_with(3.0)
+        assert retrying_searcher.error_count == 0
+
+    def test_search_global_rate_limit_pauses_breaker(self, retrying_searcher, make_response):
+        """Test that a global 429 pauses every worker sharing the breaker."""
+        responses = [
+            make_response(429, headers={"X-RateLimit-Global": "true"}, body={"retry_after": 3}),
+            make_response(200, body={}),
+        ]
+        with (
+            patch("scraper.requests.get", side_effect=responses),
+            patch("scraper.time.sleep"),
+            patch.object(retrying_searcher.circuit_breaker, "pause") as mock_pause,
+        ):
+            retrying_searcher.search("url")
+        mock_pause.assert_called_once_with(3.0)
+
+    def test_search_index_not_ready(self, retrying_searcher, make_response):
+        """Test that 202 index-not-ready responses are retried."""
+        responses = [
+            make_response(202, body={"code": 110000, "retry_after": 2}),
+            make_response(200, body={}),
+        ]
+        with (
+            patch("scraper.requests.get", side_effect=responses),
+            patch("scraper.time.sleep") as mock_sleep,
+        ):
+            retrying_searcher.search("url")
+        mock_sleep.assert_called_once_with(2.0)
+        assert retrying_searcher.error_count == 0
+
+    def test_search_index_not_ready_budget(self, retrying_searcher, make_response):
+        """Test that a guild that never finishes indexing eventually fails."""
+        retrying_searcher.retry_policy.max_index_retries = 3
+        with (
+            patch("scraper.requests.get", return_value=make_response(202, body={})) as mock_get,
+            patch("scraper.time.sleep"),
+            pytest.raises(SearchError, match="index not ready"),
+        ):
+            retrying_searcher.search("url")
+        assert mock_get.call_count == 4
+
+    @pytest.mark.parametrize("status", [401, 403])
+    def test_search_fails_fast_on_auth_errors(self, retrying_searcher, status, make_response):
+        """Test that authentication errors are not retried."""
+        with (
+            patch("scraper.requests.get", return_value=make_response(status)) as mock_get,
+            pytest.raises(SearchError),
+        ):
+            retrying_searcher.search("url")
+        assert mock_get.call_count == 1
+
+    @pytest.mark.parametrize("status", [400, 404, 405])
+    def test_search_fails_fast_on_client_errors(self, retrying_searcher, make_response, status):
+        """Test that non-transient client errors are not retried."""
+        with (
+            patch("scraper.requests.get", return_value=make_response(status)) as mock_get,
+            patch("scraper.time.sleep") as mock_sleep,
+            pytest.raises(SearchError, match=str(status)),
+        ):
+            retrying_searcher.search("url")
+        assert mock_get.call_count == 1
+        mock_sleep.assert_not_called()
+        assert retrying_searcher.error_count == 0
+
+    def test_search_rides_out_outage(self, mock_token, mock_guild_id, make_response):
+        """Test that default settings survive a 5-minute outage and then recover."""
+        clock = [0.0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        def get(*_args, **_kwargs):
+            if clock[0] < 300:
+                return make_response(503)
+            return make_response(200, body={"ok": 1})
+
+        with patch("scraper.logging.basicConfig"):
+            searcher = DiscordSearcher(guild_id=mock_guild_id, token=mock_token)
+        with (
+            patch("scraper.requests.get", side_effect=get) as mock_get,
+            patch("scraper.time.sleep", side_effect=sleep),
+            patch("scraper.time.monotonic", side_effect=lambda: clock[0]),
+        ):
+            assert searcher.search("url") == {"ok": 1}
+        # The breaker holds requests back during the outage instead of hammering the API.
+        assert mock_get.call_count < 15
+        assert searcher.circuit_breaker.state == CircuitBreaker.CLOSED
+
+    def test_search_max_errors(self, retrying_searcher, make_response):
+        """Test that hitting max errors within the window raises."""
+        with (
+            patch("scraper.requests.get", return_value=make_response(500)),
+            patch("scraper.time.sleep"),
+            pytest.raises(SearchError, match="Max errors reached"),
+        ):
+            retrying_searcher.search("url")
+
+    def test_search_errors_expire_from_window(self, retrying_searcher, make_response):
+        """Test that errors older than the window are forgotten."""
+        responses = [make_response(500)] * 4 + [make_response(200, body={})]
+        clock = itertools.count(0.0, 50.0)
+        with (
+            patch("scraper.requests.get", side_effect=responses),
+            patch("scraper.time.sleep"),
+            patch("scraper.time.monotonic", side_effect=lambda: next(clock)),
+        ):
+            assert retrying_searcher.search("url") == {}
+        assert retrying_searcher.error_count == 1
@@ -0,0 +1,382 @@
+"""Tests for the media downloader."""
+
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from downloader import MediaDownloader, iter_media, iter_output
+from scraper import RetryPolicy
+
+FILES = {
+    "/a.png": b"A" * 200_000,
+    "/b.png": b"B" * 1000,
+    "/copy-of-a.png": b"A" * 200_000,
+}
+
+
+class StaticHandler(BaseHTTPRequestHandler):
+    """Serve FILES with ETags and support for single byte-range requests."""
+
+    requests_seen: list[tuple[str, str | None]] = []
+    honor_if_range = True
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        range_header = self.headers.get("Range")
+        self.requests_seen.append((path, range_header))
+        if path == "/flaky.png" and len([p for p, _ in self.requests_seen if p == path]) == 1:
+            self.send_error(503)
+            return
+        body = FILES.get(path) if path != "/flaky.png" else FILES["/b.png"]
+        if body is None:
+            self.send_error(404)
+            return
+        etag = f'"{hashlib.sha256(body).hexdigest()}"'
+        if self.honor_if_range and self.headers.get("If-Range") not in (None, etag):
+            range_header = None
+        if range_header:
+            start = int(range_header.removeprefix("bytes=").rstrip("-"))
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+            body = body[start:]
+        else:
+            self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """Fixture providing the base URL of a local static-file server."""
+    StaticHandler.requests_seen = []
+    StaticHandler.honor_if_range = True
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StaticHandler)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    """Fixture providing a MediaDownloader writing to a temporary store."""
+    return MediaDownloader(str(tmp_path / "media"), max_workers=4)
+
+
+def sha256(data: bytes) -> str:
+    """Return the hex SHA-256 digest of data."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_partial(downloader, url, data, original):
+    """Simulate an interrupted download of ``original`` that saved ``data``."""
+    partial = downloader._partial_path(url)
+    with open(partial, "wb") as f:
+        f.write(data)
+    with open(f"{partial}.meta", "w") as f:
+        json.dump({"etag": f'"{sha256(original)}"', "length": len(original)}, f)
+
+
+def read_index(downloader):
+    """Return the parsed index entries."""
+    with open(downloader.index_path) as f:
+        return [json.loads(line) for line in f]
+
+
+class TestIterMedia:
+    """Tests for iter_media and iter_output."""
+
+    def test_attachments_and_embeds(self):
+        """Test extracting attachment and embed media URLs."""
+        messages = [
+            [
+                {
+                    "id": "1",
+                    "attachments": [{"url": "https://cdn/a.png"}],
+                    "embeds": [
+                        {
+                            "image": {"url": "https://cdn/i.png"},
+                            "thumbnail": {"url": "https://cdn/t.png"},
+                        },
+                        {"title": "no media"},
+                    ],
+                }
+            ],
+            {
+                "id": "2",
+                "attachments": [],
+                "embeds": [{"video": {"url": "https://site/v", "proxy_url": "https://cdn/v.mp4"}}],
+            },
+        ]
+        assert list(iter_media(messages)) == [
+            ("1", "https://cdn/a.png"),
+            ("1", "https://cdn/i.png"),
+            ("1", "https://cdn/t.png"),
+            ("2", "https://cdn/v.mp4"),
+        ]
+
+    def test_embed_prefers_proxy_url(self):
+        """Test that Discord's cached proxy_url is used for embed media."""
+        messages = [
+            {
+                "id": "1",
+                "embeds": [
+                    {
+                        "image": {"url": "https://site/i.png", "proxy_url": "https://proxy/i.png"},
+                        "thumbnail": {"url": "https://site/t.png"},
+                    }
+                ],
+            }
+        ]
+        assert list(iter_media(messages)) == [
+            ("1", "https://proxy/i.png"),
+            ("1", "https://site/t.png"),
+        ]
+
+    def test_embed_video_without_proxy_url_skipped(self):
+        """Test that player-page videos without a proxy_url are skipped."""
+        messages = [
+            {
+                "id": "1",
+                "embeds": [
+                    {"video": {"url": "https://www.youtube.com/embed/abc"}},
+                    {"video": {"url": "https://site/v.mp4", "proxy_url": "https://proxy/v.mp4"}},
+                ],
+            }
+        ]
+        assert list(iter_media(messages)) == [("1", "https://proxy/v.mp4")]
+
+    def test_iter_output(self, temp_output_file):
+        """Test streaming message groups from a scraper output file."""
+        with open(temp_output_file, "w") as f:
+            f.write(json.dumps([{"id": "1"}]) + "\n\n")
+            f.write(json.dumps([{"id": "2"}]) + "\n")
+        assert list(iter_output(temp_output_file)) == [[{"id": "1"}], [{"id": "2"}]]
+
+
+class TestMediaDownloader:
+    """Tests for MediaDownloader."""
+
+    def test_invalid_workers(self, tmp_path):
+        """Test that a non-positive worker count is rejected."""
+        with pytest.raises(ValueError, match="max_workers"):
+            MediaDownloader(str(tmp_path), max_workers=0)
+
+    def test_download_content_addressed(self, downloader, server):
+        """Test that files are stored once by content hash and indexed."""
+        media = [
+            ("1", f"{server}/a.png"),
+            ("2", f"{server}/b.png"),
+            ("3", f"{server}/copy-of-a.png"),
+            ("4", f"{server}/a.png"),
+        ]
+        stats = downloader.download(media)
+
+        assert stats == {"downloaded": 3, "skipped": 1, "failed": 0}
+        objects = [name for _, _, files in os.walk(downloader.objects_dir) for name in files]
+        assert sorted(objects) == sorted([sha256(FILES["/a.png"]), sha256(FILES["/b.png"])])
+        with open(downloader.object_path(sha256(FILES["/b.png"])), "rb") as f:
+            assert f.read() == FILES["/b.png"]
+
+        index = {entry["message_id"]: entry for entry in read_index(downloader)}
+        assert set(index) == {"1", "2", "3", "4"}
+        assert index["3"]["sha256"] == index["1"]["sha256"] == index["4"]["sha256"]
+        assert index["2"]["filename"] == "b.png"
+        assert not os.listdir(downloader.partial_dir)
+
+    def test_download_skips_known_urls(self, downloader, server):
+        """Test that a new downloader reuses the existing index."""
+        downloader.download([("1", f"{server}/b.png")])
+        StaticHandler.requests_seen.clear()
+
+        again = MediaDownloader(downloader.root)
+        stats = again.download([("1", f"{server}/b.png"), ("2", f"{server}/b.png")])
+
+        assert stats["skipped"] == 2
+        assert StaticHandler.requests_seen == []
+        assert [entry["message_id"] for entry in read_index(again)] == ["1", "2"]
+
+    def test_resume_partial_download(self, downloader, server):
+        """Test that an interrupted download resumes with a conditional Range request."""
+        url = f"{server}/a.png"
+        write_partial(downloader, url, FILES["/a.png"][:5000], FILES["/a.png"])
+
+        assert downloader.fetch(url) == sha256(FILES["/a.png"])
+        assert StaticHandler.requests_seen == [("/a.png", "bytes=5000-")]
+        assert not os.listdir(downloader.partial_dir)
+
+    def test_resume_without_validator_restarts(self, downloader, server):
+        """Test that a partial file without stored metadata is discarded."""
+        url = f"{server}/a.png"
+        with open(downloader._partial_path(url), "wb") as f:
+            f.write(b"stale")
+
+        assert downloader.fetch(url) == sha256(FILES["/a.png"])
+        assert StaticHandler.requests_seen == [("/a.png", None)]
+
+    def test_resume_complete_partial(self, downloader, server):
+        """Test that a fully downloaded partial file is finalized on 416."""
+        url = f"{server}/b.png"
+        write_partial(downloader, url, FILES["/b.png"], FILES["/b.png"])
+
+        assert downloader.fetch(url) == sha256(FILES["/b.png"])
+        assert len(StaticHandler.requests_seen) == 1
+
+    def test_resume_after_content_changed(self, downloader, server, monkeypatch):
+        """Test that If-Range makes the server send the new file in full."""
+        url = f"{server}/a.png"
+        old = FILES["/a.png"]
+        write_partial(downloader, url, old[:5000], old)
+        monkeypatch.setitem(FILES, "/a.png", b"C" * 150_000)
+
+        assert downloader.fetch(url) == sha256(b"C" * 150_000)
+        assert StaticHandler.requests_seen == [("/a.png", "bytes=5000-")]
+
+    def test_resume_content_changed_without_if_range(self, downloader, server, monkeypatch):
+        """Test that a mismatched Content-Range total discards the partial."""
+        StaticHandler.honor_if_range = False
+        url = f"{server}/a.png"
+        old = FILES["/a.png"]
+        write_partial(downloader, url, old[:5000], old)
+        monkeypatch.setitem(FILES, "/a.png", b"C" * 150_000)
+
+        assert downloader.fetch(url) == sha256(b"C" * 150_000)
+        assert StaticHandler.requests_seen == [("/a.png", "bytes=5000-"), ("/a.png", None)]
+
+    def test_resume_file_shrank(self, downloader, server, monkeypatch):
+        """Test that a 416 for a shrunken file restarts instead of keeping stale bytes."""
+        StaticHandler.honor_if_range = False
+        url = f"{server}/b.png"
+        old = FILES["/b.png"]
+        write_partial(downloader, url, old, old)
+        monkeypatch.setitem(FILES, "/b.png", b"D" * 10)
+
+        assert downloader.fetch(url) == sha256(b"D" * 10)
+        assert StaticHandler.requests_seen == [("/b.png", "bytes=1000-"), ("/b.png", None)]
+
+    def test_truncated_index_line(self, downloader, server):
+        """Test that a partially written last index line is dropped on load."""
+        downloader.download([("1", f"{server}/b.png")])
+        with open(downloader.index_path, "a") as f:
+            f.write('{"message_id": "2", "ur')
+
+        again = MediaDownloader(downloader.root)
+        again.download([("3", f"{server}/b.png")])
+
+        assert [entry["message_id"] for entry in read_index(again)] == ["1", "3"]
+
+    def test_duplicate_of_failed_download(self, downloader, server):
+        """Test that repeats of a failing URL are counted as failed, not skipped."""
+        url = f"{server}/missing.png"
+        stats = downloader.download([("1", url), ("2", url), ("3", url)])
+
+        assert stats == {"downloaded": 0, "skipped": 0, "failed": 3}
+
+    def test_media_iterator_error_clears_state(self, downloader, server):
+        """Test that an error from the media iterator leaves no pending downloads."""
+
+        def media():
+            yield "1", f"{server}/b.png"
+            raise ValueError("bad line")
+
+        with pytest.raises(ValueError, match="bad line"):
+            downloader.download(media())
+        assert downloader._futures == {}
+        assert downloader._sessions == []
+
+    def test_sessions_closed_after_download(self, downloader, server):
+        """Test that per-thread sessions are closed when a download finishes."""
+        opened = []
+        close = MediaDownloader.close
+
+        def spy_close(self):
+            opened.extend(self._sessions)
+            close(self)
+
+        media = [("1", f"{server}/a.png"), ("2", f"{server}/b.png"), ("3", f"{server}/flaky.png")]
+        with (
+            patch.object(MediaDownloader, "close", spy_close),
+            patch("downloader.requests.Session.close", autospec=True) as mock_close,
+            patch("downloader.time.sleep"),
+        ):
+            downloader.download(media)
+
+        assert opened
+        assert len({id(session) for session in opened}) == len(opened)
+        assert sorted(map(id, (call.args[0] for call in mock_close.call_args_list))) == sorted(
+            map(id, opened)
+        )
+        assert downloader._sessions == []
+
+    def test_unreadable_meta_discards_partial(self, downloader, server):
+        """Test that a truncated metadata file restarts the download."""
+        url = f"{server}/a.png"
+        partial = downloader._partial_path(url)
+        with open(partial, "wb") as f:
+            f.write(b"stale")
+        with open(f"{partial}.meta", "w") as f:
+            f.write('{"etag": "')
+
+        assert downloader.fetch(url) == sha256(FILES["/a.png"])
+        assert StaticHandler.requests_seen == [("/a.png", None)]
+        assert not os.listdir(downloader.partial_dir)
+
+    def test_invalid_urls_fail_fast(self, downloader):
+        """Test that permanent request errors are not retried."""
+        with patch("downloader.time.sleep") as mock_sleep:
+            stats = downloader.download([("1", "attachment://foo.png"), ("2", "not a url")])
+
+        assert stats == {"downloaded": 0, "skipped": 0, "failed": 2}
+        mock_sleep.assert_not_called()
+
+    def test_retry_connection_error(self, downloader, server):
+        """Test that connection errors are retried."""
+        url = f"{server}/b.png"
+        fetch_partial = downloader._fetch_partial
+        calls = []
+
+        def flaky(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise requests.ConnectionError("reset")
+            fetch_partial(*args)
+
+        with (
+            patch.object(downloader, "_fetch_partial", side_effect=flaky),
+            patch("downloader.time.sleep") as mock_sleep,
+        ):
+            assert downloader.fetch(url) == sha256(FILES["/b.png"])
+        mock_sleep.assert_called_once()
+
+    def test_retry_server_error(self, downloader, server):
+        """Test that server errors are retried."""
+        with patch("downloader.time.sleep") as mock_sleep:
+            assert downloader.fetch(f"{server}/flaky.png") == sha256(FILES["/b.png"])
+        mock_sleep.assert_called_once()
+
+    def test_not_found_fails_fast(self, tmp_path, server):
+        """Test that client errors are not retried and are reported as failures."""
+        downloader = MediaDownloader(str(tmp_path / "media"), retry_policy=RetryPolicy())
+        stats = downloader.download([("1", f"{server}/missing.png")])
+
+        assert stats == {"downloaded": 0, "skipped": 0, "failed": 1}
+        assert StaticHandler.requests_seen == [("/missing.png", None)]
+        assert not os.path.exists(downloader.index_path)
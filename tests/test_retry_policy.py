@@ -0,0 +1,184 @@
+"""Tests for RetryPolicy and CircuitBreaker classes."""
+
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from scraper import CircuitBreaker, RetryPolicy
+
+
+class TestRetryPolicy:
+    """Tests for RetryPolicy."""
+
+    def test_backoff_grows_exponentially(self):
+        """Test that the backoff ceiling doubles with each attempt."""
+        policy = RetryPolicy(base_delay=1.0, max_delay=100.0)
+        with patch("scraper.random.uniform", side_effect=lambda _, b: b):
+            assert [policy.backoff(n) for n in range(1, 5)] == [1.0, 2.0, 4.0, 8.0]
+
+    def test_backoff_capped_at_max_delay(self):
+        """Test that the backoff never exceeds max_delay."""
+        policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+        with patch("scraper.random.uniform", side_effect=lambda _, b: b):
+            assert policy.backoff(20) == 10.0
+
+    def test_backoff_is_jittered(self):
+        """Test that the backoff is drawn from [0, ceiling]."""
+        policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+        for _ in range(50):
+            assert 0 <= policy.backoff(3) <= 4.0
+
+    def test_invalid_configuration(self):
+        """Test that invalid settings are rejected."""
+        with pytest.raises(ValueError):
+            RetryPolicy(base_delay=0)
+        with pytest.raises(ValueError):
+            RetryPolicy(base_delay=5, max_delay=1)
+        with pytest.raises(ValueError):
+            RetryPolicy(max_errors=0)
+        with pytest.raises(ValueError):
+            RetryPolicy(max_index_retries=-1)
+        with pytest.raises(ValueError):
+            RetryPolicy(timeout=0)
+
+    def test_retry_after_header_seconds(self, make_response):
+        """Test reading Retry-After given in seconds."""
+        response = make_response(503, headers={"Retry-After": "7"})
+        assert RetryPolicy().retry_after(response) == 7.0
+
+    def test_retry_after_header_http_date(self, make_response):
+        """Test reading Retry-After given as an HTTP date in the past."""
+        response = make_response(503, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+        assert RetryPolicy().retry_after(response) == 0.0
+
+    def test_retry_after_json_body(self, make_response):
+        """Test reading retry_after from the JSON body."""
+        response = make_response(429, body={"retry_after": 1.5})
+        assert RetryPolicy().retry_after(response) == 1.5
+
+    def test_retry_after_missing(self, make_response):
+        """Test that a missing retry hint returns None."""
+        assert RetryPolicy().retry_after(make_response(500)) is None
+        assert RetryPolicy().retry_after(make_response(500, body={"message": "oops"})) is None
+
+    def test_retry_after_invalid_body(self, make_response):
+        """Test that a non-numeric retry_after in the body is ignored."""
+        policy = RetryPolicy()
+        assert policy.retry_after(make_response(429, body={"retry_after": "soon"})) is None
+        assert policy.retry_after(make_response(429, body={"retry_after": [1]})) is None
+
+    def test_retry_after_invalid_header(self, make_response):
+        """Test that an unparseable Retry-After header falls back to the body."""
+        response = make_response(503, headers={"Retry-After": "later"}, body={"retry_after": 4})
+        assert RetryPolicy().retry_after(response) == 4.0
+        assert RetryPolicy().retry_after(make_response(503, headers={"Retry-After": "nan"})) is None
+
+    def test_retry_after_clamped(self, make_response):
+        """Test that server-requested delays are capped at max_retry_after."""
+        policy = RetryPolicy(max_retry_after=10.0)
+        assert policy.retry_after(make_response(503, headers={"Retry-After": "86400"})) == 10.0
+        assert policy.retry_after(make_response(429, body={"retry_after": 1e9})) == 10.0
+        assert policy.retry_after(make_response(429, body={"retry_after": -5})) == 0.0
+
+
+class TestCircuitBreaker:
+    """Tests for CircuitBreaker."""
+
+    def test_opens_after_threshold(self):
+        """Test that the circuit opens after consecutive failures."""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30.0)
+        with patch("scraper.time.monotonic", return_value=100.0):
+            breaker.record_failure()
+            assert breaker.open_until == 0.0
+            breaker.record_failure()
+        assert breaker.open_until == 130.0
+
+    def test_success_resets_failures(self):
+        """Test that a success resets the consecutive failure count."""
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.open_until == 0.0
+
+    def test_wait_sleeps_while_open(self):
+        """Test that wait blocks until the circuit closes."""
+        breaker = CircuitBreaker()
+        breaker.open_until = 110.0
+        with (
+            patch("scraper.time.monotonic", side_effect=[100.0, 110.0]),
+            patch("scraper.time.sleep") as mock_sleep,
+        ):
+            breaker.wait()
+        mock_sleep.assert_called_once_with(10.0)
+
+    def test_wait_returns_when_closed(self):
+        """Test that wait does not sleep when the circuit is closed."""
+        breaker = CircuitBreaker()
+        with patch("scraper.time.sleep") as mock_sleep:
+            breaker.wait()
+        mock_sleep.assert_not_called()
+
+    def test_pause_extends_open_window(self):
+        """Test that pause never shortens an existing open window."""
+        breaker = CircuitBreaker()
+        with patch("scraper.time.monotonic", return_value=100.0):
+            breaker.pause(50.0)
+            breaker.pause(5.0)
+        assert breaker.open_until == 150.0
+
+    def test_half_open_after_timeout(self):
+        """Test that the first caller after the timeout becomes the probe."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+        with patch("scraper.time.monotonic", return_value=100.0):
+            breaker.record_failure()
+        with patch("scraper.time.monotonic", return_value=131.0):
+            breaker.wait()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    def test_failed_probe_reopens(self):
+        """Test that a failed probe reopens the circuit and is reported as a probe."""
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.0)
+        breaker.state = CircuitBreaker.HALF_OPEN
+        with patch("scraper.time.monotonic", return_value=100.0):
+            assert breaker.record_failure() is True
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.open_until == 130.0
+
+    def test_successful_probe_closes(self):
+        """Test that a successful probe closes the circuit."""
+        breaker = CircuitBreaker()
+        breaker.state = CircuitBreaker.HALF_OPEN
+        breaker.open_until = 1e12
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.open_until == 0.0
+
+    def test_single_probe_while_half_open(self):
+        """Test that other callers wait while a probe is in flight."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+        breaker.state = CircuitBreaker.OPEN
+        breaker.open_until = time.monotonic() - 1
+        breaker.wait()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+
+        waiter = threading.Thread(target=breaker.wait)
+        waiter.start()
+        waiter.join(0.2)
+        assert waiter.is_alive()
+
+        breaker.record_success()
+        waiter.join(1.0)
+        assert not waiter.is_alive()
+
+    def test_abandoned_probe_is_replaced(self):
+        """Test that a new probe is allowed if the previous one never reports back."""
+        breaker = CircuitBreaker(reset_timeout=30.0)
+        breaker.state = CircuitBreaker.HALF_OPEN
+        breaker.open_until = 100.0
+        with patch("scraper.time.monotonic", return_value=100.0):
+            breaker.wait()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.open_until == 130.0